@@ -1,20 +1,27 @@
 """FastAPI application demonstrating ADK Bidi-streaming with WebSocket."""
 
 import asyncio
-import json
 import logging
+import os
 import warnings
+from binascii import a2b_base64
+from collections import OrderedDict, deque
 from pathlib import Path
+from typing import Any, Awaitable, Callable, Coroutine, Literal
 
+import orjson
 from dotenv import load_dotenv
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, status
 from fastapi.responses import FileResponse
 from fastapi.staticfiles import StaticFiles
+from fastapi.websockets import WebSocketState
 from google.adk.agents.live_request_queue import LiveRequestQueue
 from google.adk.agents.run_config import RunConfig, StreamingMode
+from google.adk.events import Event
 from google.adk.runners import Runner
 from google.adk.sessions import InMemorySessionService
 from google.genai import types
+from pydantic import BaseModel, ValidationError
 import re
 
 # Load environment variables from .env file BEFORE importing agent
@@ -24,9 +31,9 @@ load_dotenv(Path(__file__).parent / ".env")
 # pylint: disable=wrong-import-position
 from gauging_agent.agent import agent
 
-# Configure logging
+# Configure logging (INFO by default, override with LOG_LEVEL=DEBUG)
 logging.basicConfig(
-    level=logging.DEBUG,
+    level=os.getenv("LOG_LEVEL", "INFO").upper(),
     format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
 )
 logger = logging.getLogger(__name__)
@@ -37,6 +44,46 @@ warnings.filterwarnings("ignore", category=UserWarning, module="pydantic")
 # Application name constant
 APP_NAME = "bidi-demo"
 
+# Regex pattern to detect end phrases (case-insensitive), compiled once per process
+END_PATTERN = re.compile(
+    r'\b(good\s*bye|goodbye|farewell|lesson\s*complete|end\s*of\s*lesson)\b',
+    re.IGNORECASE
+)
+
+# MIME type of the 16 kHz PCM audio sent by the client
+PCM_MIME_TYPE = "audio/pcm;rate=16000"
+
+# Every end phrase contains one of these substrings, so text without any of
+# them can skip the regex
+END_KEYWORDS = ("bye", "farewell", "lesson")
+
+# Static control messages, encoded once at import
+CONFIG_ERROR_FRAME = orjson.dumps({
+    "type": "error",
+    "message": "Please send configuration first (type: 'config')"
+}).decode()
+CONVERSATION_END_FRAME = orjson.dumps({
+    "type": "conversation_end",
+    "reason": "lesson_complete",
+    "message": "The lesson is complete. Great job!"
+})
+
+# Seconds a client has to send its configuration message after connecting
+CONFIG_TIMEOUT = 10.0
+
+# Trailing characters of previously scanned text carried into the next scan so
+# end phrases split across streamed chunks are still detected
+END_TAIL_CHARS = 16
+
+# Partial events are batched into one newline-delimited frame for up to this
+# many seconds, or until the batch reaches BATCH_MAX_BYTES
+BATCH_FLUSH_INTERVAL = 0.025
+BATCH_MAX_BYTES = 8192
+
+# Bytes of unsent frames a connection may hold before the client is treated
+# as too slow and disconnected
+OUTBOUND_MAX_BYTES = 4 * 1024 * 1024
+
 # ========================================
 # Phase 1: Application Initialization (once at startup)
 # ========================================
@@ -48,24 +95,590 @@ static_dir = Path(__file__).parent / "static"
 app.mount("/static", StaticFiles(directory=static_dir), name="static")
 
 
-async def configure_agent_for_topic(topic: str, title: str, user_id: str, session_id: str):
-    """Configure the agent's system instructions based on topic and title."""
-    logger.info(f"Configuring agent - Topic: {topic}, Title: {title}")
+# Define your session service and runner, shared by all connections so a
+# reconnect resumes its prior session
+session_service = InMemorySessionService()
+runner = Runner(app_name=APP_NAME, agent=agent, session_service=session_service)
+
+# Automatically determine response modality based on model architecture; the
+# model is fixed per process, so the run config is built once at startup
+_IS_NATIVE_AUDIO = "native-audio" in agent.model.lower()
+
+if _IS_NATIVE_AUDIO:
+    # Native audio models require AUDIO response modality with audio transcription
+    _RUN_CONFIG = RunConfig(
+        streaming_mode=StreamingMode.BIDI,
+        response_modalities=["AUDIO"],
+        input_audio_transcription=types.AudioTranscriptionConfig(),
+        output_audio_transcription=types.AudioTranscriptionConfig(),
+        session_resumption=types.SessionResumptionConfig(),
+    )
+    logger.debug(
+        "Native audio model detected: %s, using AUDIO response modality",
+        agent.model,
+    )
+else:
+    # Half-cascade models support TEXT response modality for faster performance
+    _RUN_CONFIG = RunConfig(
+        streaming_mode=StreamingMode.BIDI,
+        response_modalities=["TEXT"],
+        input_audio_transcription=None,
+        output_audio_transcription=None,
+        session_resumption=types.SessionResumptionConfig(),
+    )
+    logger.debug(
+        "Half-cascade model detected: %s, using TEXT response modality",
+        agent.model,
+    )
+
+# Sessions kept in session_service, keyed by (user_id, session_id) and mapped
+# to their number of open connections; only sessions with none are evicted,
+# LRU-first
+_MAX_ACTIVE_SESSIONS = 128
+_active_sessions: "OrderedDict[tuple[str, str], int]" = OrderedDict()
+
+
+async def configure_agent_for_topic(
+    topic: str, title: str, user_id: str, session_id: str
+) -> tuple[str, str]:
+    """Configure the agent's system instructions based on topic and title.
+
+    Resumes the existing session on reconnect, recreating it only when the
+    topic or title changed and no other connection is streaming on it; in
+    that case the streaming session's topic and title are kept. Returns the
+    ``(topic, title)`` actually in use. Every call must be paired with a
+    :func:`release_session` once the connection closes.
+    """
+    logger.info("Configuring agent - Topic: %s, Title: %s", topic, title)
     
     _initial_state_ = {
         "topic": topic,
         "title": title
     }
-    
-    # Define your session service
-    session_service = InMemorySessionService()
-    await session_service.create_session(
-        app_name=APP_NAME,
-        user_id=user_id,
-        state=_initial_state_,
-        session_id=session_id
+
+    key = (user_id, session_id)
+    streaming = _active_sessions.get(key, 0) > 0
+
+    session = await session_service.get_session(
+        app_name=APP_NAME, user_id=user_id, session_id=session_id
+    )
+    if session is not None and all(
+        session.state.get(k) == v for k, v in _initial_state_.items()
+    ):
+        logger.debug("Resuming existing session %s", session_id)
+    elif session is not None and streaming:
+        logger.warning(
+            "Session %s is streaming on another connection, keeping its topic",
+            session_id,
+        )
+        topic = session.state.get("topic", topic)
+        title = session.state.get("title", title)
+    else:
+        if session is not None:
+            await session_service.delete_session(
+                app_name=APP_NAME, user_id=user_id, session_id=session_id
+            )
+        await session_service.create_session(
+            app_name=APP_NAME,
+            user_id=user_id,
+            state=_initial_state_,
+            session_id=session_id
+        )
+
+    _active_sessions[key] = _active_sessions.get(key, 0) + 1
+    _active_sessions.move_to_end(key)
+    await evict_idle_sessions()
+    return topic, title
+
+
+async def release_session(user_id: str, session_id: str) -> None:
+    """Drop a closed connection's hold on its session.
+
+    The session becomes the most recently used, so a conversation that just
+    dropped outlives sessions that have been idle for longer.
+    """
+    key = (user_id, session_id)
+    _active_sessions[key] -= 1
+    _active_sessions.move_to_end(key)
+    await evict_idle_sessions()
+
+
+async def evict_idle_sessions() -> None:
+    """Delete the least recently used idle sessions while over the limit.
+
+    Sessions with an open connection are never evicted, so the limit may be
+    exceeded while more than ``_MAX_ACTIVE_SESSIONS`` are connected.
+    """
+    excess = len(_active_sessions) - _MAX_ACTIVE_SESSIONS
+    if excess <= 0:
+        return
+    idle = [key for key, count in _active_sessions.items() if count == 0]
+    for evicted_user_id, evicted_session_id in idle[:excess]:
+        del _active_sessions[(evicted_user_id, evicted_session_id)]
+        await session_service.delete_session(
+            app_name=APP_NAME,
+            user_id=evicted_user_id,
+            session_id=evicted_session_id,
+        )
+
+
+class ConfigMessage(BaseModel):
+    """Configuration message a client must send first on every connection."""
+
+    type: Literal["config"]
+    topic: str = "General"
+    title: str = "Introduction"
+
+
+class AudioCoalescer:
+    """Coalesces small PCM frames into fewer realtime blobs.
+
+    Buffered audio is sent to the queue once ``max_bytes`` have accumulated or
+    ``flush_ms`` after the first buffered frame, whichever comes first.
+    """
+
+    def __init__(
+        self,
+        live_request_queue: LiveRequestQueue,
+        max_bytes: int = 8192,
+        flush_ms: int = 25,
+    ) -> None:
+        self._queue = live_request_queue
+        self._max_bytes = max_bytes
+        self._flush_delay = flush_ms / 1000
+        self._buf = bytearray()
+        self._timer: asyncio.TimerHandle | None = None
+
+    def feed(self, data: bytes) -> None:
+        """Buffer a PCM frame, flushing when the size threshold is reached."""
+        self._buf += data
+        if len(self._buf) >= self._max_bytes:
+            self.flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(
+                self._flush_delay, self.flush
+            )
+
+    def flush(self) -> None:
+        """Send any buffered audio to the queue as a single blob."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._buf:
+            return
+        # The fields are known-valid, so skip Pydantic validation per blob
+        audio_blob = types.Blob.model_construct(
+            mime_type=PCM_MIME_TYPE, data=bytes(self._buf)
+        )
+        self._buf.clear()
+        self._queue.send_realtime(audio_blob)
+
+
+class EndPhraseDetector:
+    """Detects end phrases in the agent's streamed text.
+
+    Partial events carry text deltas, so the tail of the previous delta is
+    joined to the next one to catch a phrase split across chunks. Only
+    consecutive deltas of one stream are joined: the tail is dropped on any
+    non-partial, turn-complete or interrupted event.
+    """
+
+    def __init__(self, tail_chars: int = END_TAIL_CHARS) -> None:
+        self._tail_chars = tail_chars
+        self._tail = ""
+        # The tail keeps one extra character when cut from longer text, so a
+        # word boundary at its first character is never a false one
+        self._tail_truncated = False
+
+    def feed(self, event: Event) -> bool:
+        """Return True if the event's model text completes an end phrase."""
+        joins = (
+            event.partial is True
+            and not event.turn_complete
+            and not event.interrupted
+        )
+        if not joins:
+            self._tail = ""
+            self._tail_truncated = False
+
+        # Only the agent's own output can end the lesson, so events without
+        # model content are rejected before walking any parts
+        content = event.content
+        if content is None or content.role != "model" or not content.parts:
+            return False
+
+        for part in content.parts:
+            text = part.text
+            if not text:
+                continue
+            chunk = self._tail + text
+            new_start = len(self._tail)
+            min_start = 1 if self._tail_truncated else 0
+            if joins:
+                self._tail = chunk[-(self._tail_chars + 1):]
+                self._tail_truncated = len(chunk) > self._tail_chars + 1
+
+            lowered = chunk.casefold()
+            if not any(k in lowered for k in END_KEYWORDS):
+                continue
+            # Matches ending inside the tail were already seen by the previous
+            # scan, and one starting at a truncated tail's first character has
+            # no real word boundary before it
+            for match in END_PATTERN.finditer(chunk):
+                if match.end() > new_start and match.start() >= min_start:
+                    logger.info("Detected end phrase in: %.100s...", text)
+                    return True
+        return False
+
+
+def serialize_event(event: Event) -> bytes:
+    """Serialize an ADK event for the client as full UTF-8 JSON."""
+    # Same output as model_dump_json, dispatched straight to pydantic-core
+    return type(event).__pydantic_serializer__.to_json(
+        event, exclude_none=True, by_alias=True
+    )
+
+
+# Event fields the compact text-delta form cannot carry; an event with any of
+# them set is sent in full
+_NON_COMPACT_FIELDS = (
+    "turn_complete",
+    "interrupted",
+    "error_code",
+    "error_message",
+    "grounding_metadata",
+    "usage_metadata",
+    "citation_metadata",
+    "finish_reason",
+)
+
+
+def serialize_text_event(event: Event) -> bytes:
+    """Serialize an event from a TEXT-modality session as UTF-8 JSON.
+
+    Plain text events are sent in the compact ``{"t": "d", ...}`` text-delta
+    form; anything else (tool calls, thoughts, turn markers, errors,
+    grounding or usage metadata) falls back to :func:`serialize_event`.
+    """
+    content = event.content
+    parts = content.parts if content else None
+    if (
+        parts
+        and not any(getattr(event, f) for f in _NON_COMPACT_FIELDS)
+        and all(
+            p.text is not None and not p.function_call and not p.thought
+            for p in parts
+        )
+    ):
+        return orjson.dumps({
+            "t": "d",
+            "text": "".join(p.text for p in parts),
+            "p": bool(event.partial),
+            "a": event.author,
+        })
+    return serialize_event(event)
+
+
+def _delta_stream(event: Event) -> tuple | None:
+    """Return the text stream a partial event's delta extends.
+
+    Returns ``None`` unless the event is a single text delta that can be
+    merged with the next delta of the same stream.
+    """
+    if event.partial is not True or any(
+        getattr(event, f) for f in _NON_COMPACT_FIELDS
+    ):
+        return None
+    content = event.content
+    input_transcription = event.input_transcription
+    output_transcription = event.output_transcription
+    if content is None:
+        if (input_transcription is None) == (output_transcription is None):
+            return None
+        transcription = input_transcription or output_transcription
+        if transcription.finished or transcription.text is None:
+            return None
+        return ("input",) if input_transcription is not None else ("output",)
+    if input_transcription is not None or output_transcription is not None:
+        return None
+    parts = content.parts
+    if not parts or len(parts) != 1:
+        return None
+    part = parts[0]
+    if part.text is None or part.thought or part.function_call:
+        return None
+    return ("content", event.author, content.role)
+
+
+def _merge_deltas(first: Event, second: Event) -> Event:
+    """Return ``second`` with ``first``'s text delta prepended to its own."""
+    content = second.content
+    if content is not None:
+        text = first.content.parts[0].text + content.parts[0].text
+        return second.model_copy(update={
+            "content": types.Content(
+                role=content.role, parts=[types.Part(text=text)]
+            )
+        })
+    field = (
+        "input_transcription"
+        if second.input_transcription is not None
+        else "output_transcription"
+    )
+    text = getattr(first, field).text + getattr(second, field).text
+    return second.model_copy(
+        update={field: types.Transcription(text=text, finished=False)}
+    )
+
+
+class _QueuedFrame:
+    """A queued frame, keeping its event while it is a mergeable text delta."""
+
+    __slots__ = ("frame", "partial", "stream", "event")
+
+    def __init__(
+        self,
+        frame: bytes,
+        partial: bool,
+        stream: tuple | None = None,
+        event: Event | None = None,
+    ) -> None:
+        self.frame = frame
+        self.partial = partial
+        self.stream = stream
+        self.event = event
+
+
+class OutboundQueue:
+    """Frames waiting to be sent to the client, bounded for slow clients.
+
+    Yields ``(frame, is_partial)`` pairs, with ``None`` marking the end of the
+    stream. Partial events carry text deltas that the client appends, so none
+    can be dropped; once ``maxsize`` frames are queued, a new delta is merged
+    into the last queued delta of the same stream instead, as long as nothing
+    queued since then ends that stream. Memory is bounded by ``max_bytes``:
+    queuing past it raises :class:`asyncio.QueueFull`.
+    """
+
+    def __init__(
+        self,
+        serialize: Callable[[Event], bytes],
+        maxsize: int = 32,
+        max_bytes: int = OUTBOUND_MAX_BYTES,
+    ) -> None:
+        self._serialize = serialize
+        self._maxsize = maxsize
+        self._max_bytes = max_bytes
+        self._size = 0
+        self._items: deque[_QueuedFrame | None] = deque()
+        # Last queued, still mergeable delta of each stream
+        self._tails: dict[tuple, _QueuedFrame] = {}
+        self._not_empty = asyncio.Event()
+
+    def put_event(self, frame: bytes, event: Event) -> None:
+        """Queue an event's frame, merging text deltas when full."""
+        stream = _delta_stream(event)
+        if stream is None:
+            self._end_streams(event)
+            self._append(_QueuedFrame(frame, event.partial is True))
+            return
+
+        tail = self._tails.get(stream)
+        if tail is not None and len(self._items) >= self._maxsize:
+            merged = _merge_deltas(tail.event, event)
+            merged_frame = self._serialize(merged)
+            self._check_size(len(merged_frame) - len(tail.frame))
+            self._size += len(merged_frame) - len(tail.frame)
+            tail.frame = merged_frame
+            tail.event = merged
+            logger.debug("Client is behind, merged two partial events")
+            return
+
+        queued = _QueuedFrame(frame, True, stream, event)
+        self._append(queued)
+        self._tails[stream] = queued
+
+    def put_nowait(self, item: tuple[bytes, bool] | None) -> None:
+        """Queue a control frame, or ``None`` to end the stream."""
+        self._tails.clear()
+        self._append(None if item is None else _QueuedFrame(*item))
+
+    def _end_streams(self, event: Event) -> None:
+        """Stop merging into the streams a non-delta event may render after."""
+        if event.turn_complete or event.interrupted:
+            self._tails.clear()
+            return
+        if event.input_transcription is not None:
+            self._tails.pop(("input",), None)
+        if event.output_transcription is not None:
+            self._tails.pop(("output",), None)
+        content = event.content
+        if content is not None and any(
+            p.text is not None for p in content.parts or ()
+        ):
+            self._tails.pop(("content", event.author, content.role), None)
+
+    def _check_size(self, added: int) -> None:
+        """Raise QueueFull if ``added`` more bytes would exceed the limit."""
+        if self._size + added > self._max_bytes:
+            raise asyncio.QueueFull
+
+    def _append(self, queued: _QueuedFrame | None) -> None:
+        """Add a frame to the end of the queue."""
+        if queued is not None:
+            self._check_size(len(queued.frame))
+            self._size += len(queued.frame)
+        self._items.append(queued)
+        self._not_empty.set()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def get_nowait(self) -> tuple[bytes, bool] | None:
+        """Remove and return the oldest frame, raising QueueEmpty if none."""
+        if not self._items:
+            raise asyncio.QueueEmpty
+        queued = self._items.popleft()
+        if queued is None:
+            return None
+        self._size -= len(queued.frame)
+        if queued.stream is not None and self._tails.get(queued.stream) is queued:
+            del self._tails[queued.stream]
+        return queued.frame, queued.partial
+
+    async def get(self) -> tuple[bytes, bool] | None:
+        """Remove and return the oldest frame, waiting until one is queued."""
+        while not self._items:
+            self._not_empty.clear()
+            await self._not_empty.wait()
+        return self.get_nowait()
+
+
+def send_text_message(
+    json_message: dict, live_request_queue: LiveRequestQueue, debug_enabled: bool
+) -> None:
+    """Forward a ``{"type": "text"}`` client message to the model."""
+    text = json_message.get("text")
+    if not isinstance(text, str):
+        logger.warning("Ignoring text message without a string 'text' field")
+        return
+    if debug_enabled:
+        logger.debug("Sending text content: %s", text)
+    # text is checked above, so pydantic validation of both models can be
+    # skipped
+    content = types.Content.model_construct(
+        parts=[types.Part.model_construct(text=text)]
     )
-    return session_service
+    live_request_queue.send_content(content)
+
+
+async def send_image_message(
+    json_message: dict, live_request_queue: LiveRequestQueue, debug_enabled: bool
+) -> None:
+    """Forward a ``{"type": "image"}`` client message to the model."""
+    if debug_enabled:
+        logger.debug("Received image data")
+
+    # Decode base64 image data in a worker thread so large snapshots don't
+    # block the event loop (downstream events, timers, other sessions); this
+    # connection's next frames are still read only after the decode finishes
+    image_data = await asyncio.to_thread(a2b_base64, json_message["data"])
+    mime_type = json_message.get("mimeType", "image/jpeg")
+
+    if debug_enabled:
+        logger.debug(
+            "Sending image: %d bytes, type: %s", len(image_data), mime_type
+        )
+
+    # Send image as blob
+    image_blob = types.Blob(mime_type=mime_type, data=image_data)
+    live_request_queue.send_realtime(image_blob)
+
+
+# Client JSON message handlers, keyed by the message "type" field; unknown
+# types are ignored. Handlers that need to wait (image decoding) return an
+# awaitable, so the common text path runs without creating a coroutine
+MESSAGE_HANDLERS: dict[
+    str, Callable[[dict, LiveRequestQueue, bool], Awaitable[None] | None]
+] = {
+    "text": send_text_message,
+    "image": send_image_message,
+}
+
+
+async def send_outbound_frames(
+    outbound: OutboundQueue, send_text: Callable[[str], Awaitable[None]]
+) -> None:
+    """Send queued frames with ``send_text``, coalescing them into batches.
+
+    Returns once the end-of-stream marker has been sent.
+    """
+    logger.debug("sender_task started")
+    loop = asyncio.get_running_loop()
+
+    stream_ended = False
+    while not stream_ended:
+        item = await outbound.get()
+        if item is None:
+            break
+        frame, partial = item
+        batch = [frame]
+        size = len(frame)
+
+        # Take everything already queued, then hold a trailing partial event
+        # briefly so bursts of small deltas share a frame; a trailing
+        # non-partial event flushes the batch immediately
+        deadline = loop.time() + BATCH_FLUSH_INTERVAL
+        while size < BATCH_MAX_BYTES:
+            if outbound:
+                item = outbound.get_nowait()
+            elif partial:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(outbound.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+            else:
+                break
+            if item is None:
+                stream_ended = True
+                break
+            frame, partial = item
+            batch.append(frame)
+            size += len(frame)
+
+        # Frames stay UTF-8 bytes until here, so each batch is decoded once
+        # for the text frame rather than once per event
+        await send_text(b"\n".join(batch).decode())
+
+    logger.debug("sender_task ended")
+
+
+async def run_session_tasks(
+    upstream: Coroutine[Any, Any, None],
+    downstream: Coroutine[Any, Any, None],
+    sender: Coroutine[Any, Any, None],
+) -> None:
+    """Run a connection's upstream, downstream and sender tasks together.
+
+    Whichever of upstream and downstream finishes first ends the session and
+    cancels the other. When downstream finishes, the sender is left to flush
+    the remaining frames up to the end-of-stream marker; it is only cancelled
+    when upstream ends on its own (client disconnect or error), since
+    downstream then never queues that marker.
+    """
+    async with asyncio.TaskGroup() as tg:
+        upstream_t = tg.create_task(upstream)
+        downstream_t = tg.create_task(downstream)
+        sender_t = tg.create_task(sender)
+
+        upstream_t.add_done_callback(lambda _: downstream_t.cancel())
+        upstream_t.add_done_callback(
+            lambda t: None if t.cancelled() else sender_t.cancel()
+        )
+        downstream_t.add_done_callback(lambda _: upstream_t.cancel())
 
 
 # ========================================
@@ -88,130 +701,76 @@ async def websocket_endpoint(
 ) -> None:
     """WebSocket endpoint for bidirectional streaming with ADK."""
     logger.debug(
-        f"WebSocket connection request: user_id={user_id}, session_id={session_id}"
+        "WebSocket connection request: user_id=%s, session_id=%s",
+        user_id,
+        session_id,
     )
     await websocket.accept()
     logger.debug("WebSocket connection accepted")
 
-    # Flag to track if configuration has been received
-    config_received = False
-    config_data = {}
-    
-    # Flag to signal conversation end
-    conversation_ended = asyncio.Event()
-
     # ========================================
     # Phase 2: Wait for Configuration
     # ========================================
 
     try:
-        # Wait for initial configuration message
+        # The configuration message must be the first frame; binary frames or
+        # any other message type are a protocol violation
         logger.info("Waiting for configuration message from client...")
+        text_data = await asyncio.wait_for(
+            websocket.receive_text(), timeout=CONFIG_TIMEOUT
+        )
+        # Parses, validates and fills defaults in one pass
+        config = ConfigMessage.model_validate_json(text_data)
         
-        while not config_received:
-            message = await websocket.receive()
-            
-            if "text" in message:
-                text_data = message["text"]
-                json_message = json.loads(text_data)
-                
-                # Check if this is a config message
-                if json_message.get("type") == "config":
-                    topic = json_message.get("topic", "General")
-                    title = json_message.get("title", "Introduction")
-                    
-                    logger.info(f"Configuration received - Topic: {topic}, Title: {title}")
-                    
-                    # Store config data
-                    config_data = {
-                        "topic": topic,
-                        "title": title
-                    }
-                    config_received = True
-                    
-                    # Send acknowledgment back to client
-                    ack_message = {
-                        "type": "config_ack",
-                        "status": "ready",
-                        "message": f"Ready to start conversation about {topic}: {title}",
-                        "topic": topic,
-                        "title": title
-                    }
-                    await websocket.send_text(json.dumps(ack_message))
-                    logger.info("Configuration acknowledgment sent to client")
-                    break
-                else:
-                    # Not a config message, send error
-                    error_message = {
-                        "type": "error",
-                        "message": "Please send configuration first (type: 'config')"
-                    }
-                    await websocket.send_text(json.dumps(error_message))
+        logger.info(
+            "Configuration received - Topic: %s, Title: %s",
+            config.topic,
+            config.title,
+        )
 
     except WebSocketDisconnect:
         logger.warning("Client disconnected before sending configuration")
         return
+    except asyncio.TimeoutError:
+        logger.warning("Timed out waiting for configuration message")
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    except ValidationError:
+        # Not a valid config message, send error and close
+        logger.warning("Invalid configuration message from client")
+        await websocket.send_text(CONFIG_ERROR_FRAME)
+        await websocket.close(code=status.WS_1003_UNSUPPORTED_DATA)
+        return
+    except KeyError:
+        # receive_text() raises KeyError on a binary frame
+        logger.warning("Binary frame received before configuration")
+        await websocket.close(code=status.WS_1003_UNSUPPORTED_DATA)
+        return
     except Exception as e:
-        logger.error(f"Error during configuration: {e}", exc_info=True)
+        logger.error("Error during configuration: %s", e, exc_info=True)
         return
     
-    # Configure the agent
-    session_service = await configure_agent_for_topic(
-        config_data["topic"], 
-        config_data["title"], 
-        user_id, 
+    # Configure the agent; this gets or creates the session (handles both new
+    # sessions and reconnections) and returns the topic and title in use
+    topic, title = await configure_agent_for_topic(
+        config.topic,
+        config.title,
+        user_id,
         session_id
     )
     
-    # Define your runner
-    runner = Runner(app_name=APP_NAME, agent=agent, session_service=session_service)
-    
     # ========================================
     # Phase 3: Session Initialization (after config received)
     # ========================================
 
-    # Automatically determine response modality based on model architecture
-    model_name = agent.model
-    is_native_audio = "native-audio" in model_name.lower()
-
-    if is_native_audio:
-        # Native audio models require AUDIO response modality with audio transcription
-        response_modalities = ["AUDIO"]
-        run_config = RunConfig(
-            streaming_mode=StreamingMode.BIDI,
-            response_modalities=response_modalities,
-            input_audio_transcription=types.AudioTranscriptionConfig(),
-            output_audio_transcription=types.AudioTranscriptionConfig(),
-            session_resumption=types.SessionResumptionConfig(),
-        )
-        logger.debug(
-            f"Native audio model detected: {model_name}, using AUDIO response modality"
-        )
-    else:
-        # Half-cascade models support TEXT response modality for faster performance
-        response_modalities = ["TEXT"]
-        run_config = RunConfig(
-            streaming_mode=StreamingMode.BIDI,
-            response_modalities=response_modalities,
-            input_audio_transcription=None,
-            output_audio_transcription=None,
-            session_resumption=types.SessionResumptionConfig(),
-        )
-        logger.debug(
-            f"Half-cascade model detected: {model_name}, using TEXT response modality"
-        )
-    logger.debug(f"RunConfig created: {run_config}")
-
-    # Get or create session (handles both new sessions and reconnections)
-    session = await session_service.get_session(
-        app_name=APP_NAME, user_id=user_id, session_id=session_id
+    # Copy the prebuilt run config; session resumption state is written into
+    # its SessionResumptionConfig, so each connection gets a fresh one
+    run_config = _RUN_CONFIG.model_copy(
+        update={"session_resumption": types.SessionResumptionConfig()}
     )
-    if not session:
-        await session_service.create_session(
-            app_name=APP_NAME, user_id=user_id, session_id=session_id
-        )
 
     live_request_queue = LiveRequestQueue()
+    audio_coalescer = AudioCoalescer(live_request_queue)
 
     # ========================================
     # Phase 4: Active Session (concurrent bidirectional communication)
@@ -220,137 +779,151 @@ async def websocket_endpoint(
     async def upstream_task() -> None:
         """Receives messages from WebSocket and sends to LiveRequestQueue."""
         logger.debug("upstream_task started")
+
+        # Checked once so per-frame logging costs nothing when DEBUG is off
+        debug_enabled = logger.isEnabledFor(logging.DEBUG)
+
+        # Bind hot-loop lookups to locals once
+        loads = orjson.loads
+        get_handler = MESSAGE_HANDLERS.get
+        # The socket is already connected, so read the raw ASGI receive
+        # callable and skip Starlette's per-call state checks
+        recv = websocket._receive  # pylint: disable=protected-access
         
-        while not conversation_ended.is_set():
+        # Runs until the client disconnects or is cancelled when
+        # downstream_task finishes
+        while True:
             try:
-                # Add timeout to check conversation_ended flag periodically
-                message = await asyncio.wait_for(
-                    websocket.receive(), 
-                    timeout=0.5
-                )
-            except asyncio.TimeoutError:
-                # Timeout - just continue loop to check conversation_ended flag
-                continue
-            except WebSocketDisconnect:
-                logger.debug("Client disconnected in upstream_task")
-                break
+                message = await recv()
+            except asyncio.CancelledError:
+                logger.debug("upstream_task cancelled - conversation complete")
+                raise
             except Exception as e:
-                logger.error(f"Error in upstream_task: {e}")
+                logger.error("Error in upstream_task: %s", e)
                 break
 
-            # Handle binary frames (audio data)
-            if "bytes" in message:
-                audio_data = message["bytes"]
-                logger.debug(f"Received binary audio chunk: {len(audio_data)} bytes")
+            # A disconnect arrives as a message rather than an exception; record
+            # it as Starlette's receive() would and propagate it so the
+            # TaskGroup cancels downstream_task promptly
+            if message["type"] == "websocket.disconnect":
+                logger.debug("Client disconnected in upstream_task")
+                websocket.client_state = WebSocketState.DISCONNECTED
+                raise WebSocketDisconnect(message.get("code", 1000))
+
+            # Handle binary frames (audio data); one lookup per frame, and
+            # robust to servers that send the unused key as None
+            audio_data = message.get("bytes")
+            if audio_data is not None:
+                if debug_enabled:
+                    logger.debug(
+                        "Received binary audio chunk: %d bytes", len(audio_data)
+                    )
 
-                audio_blob = types.Blob(
-                    mime_type="audio/pcm;rate=16000", data=audio_data
-                )
-                live_request_queue.send_realtime(audio_blob)
+                audio_coalescer.feed(audio_data)
 
             # Handle text frames (JSON messages)
-            elif "text" in message:
-                text_data = message["text"]
-                logger.debug(f"Received text message: {text_data[:100]}...")
+            elif (text_data := message.get("text")) is not None:
+                if debug_enabled:
+                    logger.debug("Received text message: %.100s...", text_data)
 
-                json_message = json.loads(text_data)
+                json_message = loads(text_data)
 
-                # Extract text from JSON and send to LiveRequestQueue
-                if json_message.get("type") == "text":
-                    logger.debug(f"Sending text content: {json_message['text']}")
-                    content = types.Content(
-                        parts=[types.Part(text=json_message["text"])]
+                # Dispatch on the message type with a single lookup
+                handler = get_handler(json_message.get("type"))
+                if handler is not None:
+                    pending = handler(
+                        json_message, live_request_queue, debug_enabled
                     )
-                    live_request_queue.send_content(content)
-
-                # Handle image data
-                elif json_message.get("type") == "image":
-                    import base64
-
-                    logger.debug("Received image data")
-
-                    # Decode base64 image data
-                    image_data = base64.b64decode(json_message["data"])
-                    mime_type = json_message.get("mimeType", "image/jpeg")
+                    if pending is not None:
+                        await pending
+        
+        logger.debug("upstream_task ended")
 
-                    logger.debug(
-                        f"Sending image: {len(image_data)} bytes, type: {mime_type}"
-                    )
+    # The modality is fixed per process, so only TEXT sessions pay for the
+    # compact-form check
+    serialize = serialize_event if _IS_NATIVE_AUDIO else serialize_text_event
 
-                    # Send image as blob
-                    image_blob = types.Blob(mime_type=mime_type, data=image_data)
-                    live_request_queue.send_realtime(image_blob)
-        
-        logger.debug("upstream_task ended - conversation complete")
+    # Frames queued by downstream_task for sender_task
+    outbound = OutboundQueue(serialize)
 
     async def downstream_task() -> None:
         """Receives Events from run_live() and sends to WebSocket."""
         logger.debug("downstream_task started, calling runner.run_live()")
         logger.debug(
-            f"Starting run_live with user_id={user_id}, session_id={session_id}"
+            "Starting run_live with user_id=%s, session_id=%s",
+            user_id,
+            session_id,
         )
 
-        # Regex pattern to detect end phrases (case-insensitive)
-        end_pattern = re.compile(
-            r'\b(good\s*bye|goodbye|farewell|lesson\s*complete|end\s*of\s*lesson)\b',
-            re.IGNORECASE
-        )
-        
+        # Scans each event's new text, joining consecutive partial deltas
+        detect_end = EndPhraseDetector().feed
+
+        # Checked once so per-event logging costs nothing when DEBUG is off
+        debug_enabled = logger.isEnabledFor(logging.DEBUG)
+
+        # Bind hot-loop lookups to locals once
+        enqueue = outbound.put_event
+
         async for event in runner.run_live(
             user_id=user_id,
             session_id=session_id,
             live_request_queue=live_request_queue,
             run_config=run_config,
         ):
-            event_json = event.model_dump_json(exclude_none=True, by_alias=True)
-            logger.debug(f"[SERVER] Event: {event_json}")
+            event_json = serialize(event)
+            if debug_enabled:
+                logger.debug("[SERVER] Event: %s", event_json.decode())
 
             # Check if the agent's response contains any end phrase
-            should_end = False
-            if hasattr(event, 'content') and event.content and hasattr(event.content, 'parts'):
-                for part in event.content.parts:
-                    if hasattr(part, 'text') and part.text:
-                        # Check if pattern matches
-                        if end_pattern.search(part.text):
-                            logger.info(f"Detected end phrase in: {part.text[:100]}...")
-                            should_end = True
-                            break
-            
-            # Send the event first (so user sees the goodbye message)
-            await websocket.send_text(event_json)
+            should_end = detect_end(event)
+
+            # Queue the event first (so user sees the goodbye message)
+            enqueue(event_json, event)
 
             # If end detected, send end signal and stop
             if should_end:
-                end_signal = {
-                    "type": "conversation_end",
-                    "reason": "lesson_complete",
-                    "message": "The lesson is complete. Great job!"
-                }
-                await websocket.send_text(json.dumps(end_signal))
-                logger.info("Sent conversation_end signal to client")
-                
-                # Signal the upstream task to stop accepting messages
-                conversation_ended.set()
-                logger.info("Conversation ended flag set - stopping upstream task")
+                outbound.put_nowait((CONVERSATION_END_FRAME, False))
+                logger.info("Queued conversation_end signal to client")
                 
                 # Close the queue to stop receiving new messages
                 live_request_queue.close()
                 logger.info("Live request queue closed - no more messages accepted")
                 
-                # Exit the downstream loop
+                # Exit the downstream loop (this cancels upstream_task)
                 break
                   
+        outbound.put_nowait(None)
         logger.debug("run_live() generator completed")
 
-    # Run both tasks concurrently
     try:
-        logger.debug("Starting asyncio.gather for upstream and downstream tasks")
-        await asyncio.gather(upstream_task(), downstream_task())
-        logger.debug("asyncio.gather completed normally")
-    except WebSocketDisconnect:
+        # Send acknowledgment back to client; inside the try so the session is
+        # released even if the client is already gone
+        ack_message = {
+            "type": "config_ack",
+            "status": "ready",
+            "message": f"Ready to start conversation about {topic}: {title}",
+            "topic": topic,
+            "title": title
+        }
+        await websocket.send_text(orjson.dumps(ack_message).decode())
+        logger.info("Configuration acknowledgment sent to client")
+
+        # Run the tasks concurrently; a failure in any cancels its siblings
+        logger.debug("Starting TaskGroup for upstream, downstream and sender tasks")
+        await run_session_tasks(
+            upstream_task(),
+            downstream_task(),
+            send_outbound_frames(outbound, websocket.send_text),
+        )
+        logger.debug("TaskGroup completed normally")
+    except* WebSocketDisconnect:
         logger.debug("Client disconnected normally")
-    except Exception as e:
-        logger.error(f"Unexpected error in streaming tasks: {e}", exc_info=True)
+    except* asyncio.QueueFull:
+        logger.warning("Client fell too far behind, closing the connection")
+        if websocket.client_state == WebSocketState.CONNECTED:
+            await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER)
+    except* Exception as eg:
+        logger.error("Unexpected error in streaming tasks: %s", eg, exc_info=True)
     finally:
         # ========================================
         # Phase 5: Session Termination
@@ -358,5 +931,7 @@ async def websocket_endpoint(
 
         # Always close the queue, even if exceptions occurred
         logger.debug("Closing live_request_queue in finally block")
+        audio_coalescer.flush()
         live_request_queue.close()
-        logger.info(f"Session {session_id} terminated")
\ No newline at end of file
+        await release_session(user_id, session_id)
+        logger.info("Session %s terminated", session_id)
\ No newline at end of file
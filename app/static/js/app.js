@@ -269,6 +269,19 @@ function sanitizeEventForDisplay(event) {
   return sanitized;
 }
 
+// Expand the server's compact text-delta form ({"t": "d", ...}) into the
+// ADK Event shape used by the handlers below
+function expandCompactEvent(message) {
+  if (message.t !== "d") {
+    return message;
+  }
+  return {
+    author: message.a,
+    partial: message.p,
+    content: { role: "model", parts: [{ text: message.text }] }
+  };
+}
+
 // WebSocket handlers
 function connectWebsocket() {
   // Connect websocket
@@ -294,9 +307,15 @@ function connectWebsocket() {
   };
 
   // Handle incoming messages
+  // (the server may batch several events into one newline-delimited frame)
   websocket.onmessage = function (event) {
-    // Parse the incoming ADK Event
-    const adkEvent = JSON.parse(event.data);
+    for (const line of event.data.split("\n")) {
+      handleAdkEvent(expandCompactEvent(JSON.parse(line)));
+    }
+  };
+
+  // Handle a single ADK Event
+  function handleAdkEvent(adkEvent) {
     console.log("[AGENT TO CLIENT] ", adkEvent);
 
     // Log to console panel
@@ -573,7 +592,7 @@ function connectWebsocket() {
         }
       }
     }
-  };
+  }
 
   // Handle connection close
   websocket.onclose = function () {
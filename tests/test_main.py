@@ -0,0 +1,375 @@
+"""Tests for the streaming helpers in app/main.py."""
+
+import asyncio
+from collections import OrderedDict
+
+import orjson
+import pytest
+from fastapi.testclient import TestClient
+from google.adk.events import Event
+from google.adk.sessions import InMemorySessionService
+from google.genai import types
+
+import main
+
+
+def _model_event(text: str, **fields) -> Event:
+    return Event(
+        author="gauging_agent",
+        content=types.Content(role="model", parts=[types.Part(text=text)]),
+        **fields,
+    )
+
+
+def _feed_all(detector: main.EndPhraseDetector, events: list[Event]) -> list[bool]:
+    return [detector.feed(event) for event in events]
+
+
+@pytest.fixture
+def sessions(monkeypatch):
+    service = InMemorySessionService()
+    monkeypatch.setattr(main, "session_service", service)
+    monkeypatch.setattr(main, "_active_sessions", OrderedDict())
+    monkeypatch.setattr(main, "_MAX_ACTIVE_SESSIONS", 1)
+    return service
+
+
+async def _get_session(service: InMemorySessionService, session_id: str):
+    return await service.get_session(
+        app_name=main.APP_NAME, user_id="user", session_id=session_id
+    )
+
+
+async def _slow_send(sent: list[str], data: str) -> None:
+    # A real write yields to the event loop under backpressure
+    await asyncio.sleep(0.001)
+    sent.append(data)
+
+
+async def test_conversation_end_reaches_slow_sender():
+    outbound = main.OutboundQueue(main.serialize_event)
+    sent: list[str] = []
+    goodbye = b'{"content":{"role":"model","parts":[{"text":"Goodbye!"}]}}'
+
+    async def upstream():
+        # Blocks like a client that never sends anything
+        await asyncio.Event().wait()
+
+    async def downstream():
+        outbound.put_nowait((goodbye, False))
+        outbound.put_nowait((main.CONVERSATION_END_FRAME, False))
+        outbound.put_nowait(None)
+
+    await asyncio.wait_for(
+        main.run_session_tasks(
+            upstream(),
+            downstream(),
+            main.send_outbound_frames(outbound, lambda d: _slow_send(sent, d)),
+        ),
+        timeout=1,
+    )
+
+    frames = "\n".join(sent).split("\n")
+    assert frames == [goodbye.decode(), main.CONVERSATION_END_FRAME.decode()]
+
+
+async def test_upstream_exit_cancels_waiting_sender():
+    outbound = main.OutboundQueue(main.serialize_event)
+    sent: list[str] = []
+
+    async def upstream():
+        return
+
+    async def downstream():
+        await asyncio.Event().wait()
+
+    # Downstream never queues the end-of-stream marker, so the sender must be
+    # cancelled for the session to finish
+    await asyncio.wait_for(
+        main.run_session_tasks(
+            upstream(),
+            downstream(),
+            main.send_outbound_frames(outbound, lambda d: _slow_send(sent, d)),
+        ),
+        timeout=1,
+    )
+
+    assert sent == []
+
+
+def test_end_phrase_split_across_partial_deltas():
+    detector = main.EndPhraseDetector()
+    events = [
+        _model_event("Great work today. Good", partial=True),
+        _model_event("bye for now!", partial=True),
+    ]
+    assert _feed_all(detector, events) == [False, True]
+
+
+def test_end_phrase_not_matched_twice_from_tail():
+    detector = main.EndPhraseDetector()
+    events = [
+        _model_event("Farewell", partial=True),
+        _model_event(" and see you", partial=True),
+    ]
+    assert _feed_all(detector, events) == [True, False]
+
+
+def test_end_phrase_at_start_of_new_event():
+    # The previous event's text must not be glued onto the next one
+    for first in (
+        _model_event("You nailed it"),
+        _model_event("You nailed it", partial=True),
+    ):
+        detector = main.EndPhraseDetector()
+        events = [
+            first,
+            _model_event("", turn_complete=True),
+            _model_event("Goodbye and good luck", partial=True),
+        ]
+        assert _feed_all(detector, events) == [False, False, True]
+
+
+def test_end_phrase_after_final_event():
+    detector = main.EndPhraseDetector()
+    events = [
+        _model_event("Next question: what is a closure"),
+        _model_event("Farewell, see you soon"),
+    ]
+    assert _feed_all(detector, events) == [False, True]
+
+
+def test_end_phrase_ignored_at_truncated_tail_boundary():
+    # "xgood bye" has no word boundary before "good"; the cut tail "good "
+    # must not pretend it does
+    detector = main.EndPhraseDetector(tail_chars=4)
+    events = [
+        _model_event("xgood ", partial=True),
+        _model_event("bye", partial=True),
+    ]
+    assert _feed_all(detector, events) == [False, False]
+
+
+def test_end_phrase_after_truncated_tail_boundary():
+    detector = main.EndPhraseDetector(tail_chars=4)
+    events = [
+        _model_event("well, good", partial=True),
+        _model_event("bye", partial=True),
+    ]
+    assert _feed_all(detector, events) == [False, True]
+
+
+def test_end_phrase_ignores_user_content():
+    detector = main.EndPhraseDetector()
+    event = Event(
+        author="user",
+        content=types.Content(role="user", parts=[types.Part(text="Goodbye")]),
+    )
+    assert detector.feed(event) is False
+
+
+async def test_connected_session_is_not_evicted(sessions):
+    await main.configure_agent_for_topic("Python", "Loops", "user", "a")
+    await main.configure_agent_for_topic("Python", "Loops", "user", "b")
+    assert await _get_session(sessions, "a") is not None
+
+    # Once its connection closes, the oldest idle session is evicted
+    await main.release_session("user", "a")
+    assert await _get_session(sessions, "a") is None
+    assert await _get_session(sessions, "b") is not None
+
+
+async def test_released_session_becomes_most_recently_used(
+    sessions, monkeypatch
+):
+    monkeypatch.setattr(main, "_MAX_ACTIVE_SESSIONS", 2)
+    await main.configure_agent_for_topic("Python", "Loops", "user", "long")
+    await main.configure_agent_for_topic("Python", "Loops", "user", "idle")
+    await main.release_session("user", "idle")
+
+    # The long conversation drops after "idle" went quiet, so "idle" goes
+    await main.release_session("user", "long")
+    await main.configure_agent_for_topic("Python", "Loops", "user", "new")
+    assert await _get_session(sessions, "idle") is None
+    assert await _get_session(sessions, "long") is not None
+
+
+async def test_streaming_session_is_not_recreated(sessions):
+    await main.configure_agent_for_topic("Python", "Loops", "user", "a")
+    in_use = await main.configure_agent_for_topic("Rust", "Traits", "user", "a")
+    assert in_use == ("Python", "Loops")
+    assert (await _get_session(sessions, "a")).state["topic"] == "Python"
+
+    # With no connection left, a new topic recreates the session
+    await main.release_session("user", "a")
+    await main.release_session("user", "a")
+    await main.configure_agent_for_topic("Rust", "Traits", "user", "a")
+    assert (await _get_session(sessions, "a")).state["topic"] == "Rust"
+
+
+class _FinishedRunner:
+    async def run_live(self, **kwargs):
+        return
+        yield
+
+
+def test_config_ack_reports_topic_in_use(sessions, monkeypatch):
+    monkeypatch.setattr(main, "runner", _FinishedRunner())
+    asyncio.run(
+        main.configure_agent_for_topic("Python", "Loops", "user", "a")
+    )
+
+    with TestClient(main.app).websocket_connect("/ws/user/a") as ws:
+        ws.send_text('{"type": "config", "topic": "Rust", "title": "Traits"}')
+        ack = orjson.loads(ws.receive_text())
+
+    assert ack["type"] == "config_ack"
+    assert (ack["topic"], ack["title"]) == ("Python", "Loops")
+
+
+def _drain(outbound: main.OutboundQueue) -> list:
+    items = []
+    while outbound:
+        items.append(outbound.get_nowait())
+    return items
+
+
+def _put(outbound: main.OutboundQueue, event: Event) -> None:
+    outbound.put_event(main.serialize_text_event(event), event)
+
+
+def _transcription(text: str) -> Event:
+    return Event(
+        author="agent",
+        partial=True,
+        output_transcription=types.Transcription(text=text, finished=False),
+    )
+
+
+def _audio() -> Event:
+    blob = types.Blob(mime_type="audio/pcm", data=b"\0" * 64)
+    return Event(
+        author="agent",
+        content=types.Content(role="model", parts=[types.Part(inline_data=blob)]),
+    )
+
+
+def test_full_queue_merges_partial_deltas():
+    outbound = main.OutboundQueue(main.serialize_text_event, maxsize=2)
+    for text in ("Hel", "lo ", "there"):
+        _put(outbound, _model_event(text, partial=True))
+
+    items = _drain(outbound)
+    assert len(items) == 2
+    assert all(partial for _, partial in items)
+    assert [orjson.loads(frame)["text"] for frame, _ in items] == [
+        "Hel", "lo there"
+    ]
+
+
+def test_full_queue_merges_transcription_deltas_across_audio():
+    outbound = main.OutboundQueue(main.serialize_event, maxsize=1)
+    for event in (_transcription("Good"), _audio(), _transcription("bye")):
+        _put(outbound, event)
+
+    (frame, partial), (audio_frame, audio_partial) = _drain(outbound)
+    assert partial and not audio_partial
+    assert orjson.loads(frame)["outputTranscription"]["text"] == "Goodbye"
+    assert "inlineData" in orjson.loads(audio_frame)["content"]["parts"][0]
+
+
+def test_full_queue_does_not_merge_across_stream_end():
+    outbound = main.OutboundQueue(main.serialize_text_event, maxsize=1)
+    events = [
+        _model_event("a", partial=True),
+        _model_event("", turn_complete=True),
+        _model_event("b", partial=True),
+        _transcription("c"),
+    ]
+    for event in events:
+        _put(outbound, event)
+
+    # Nothing can be merged without reordering text, so the queue grows past
+    # maxsize instead
+    assert _drain(outbound) == [
+        (main.serialize_text_event(event), event.partial is True)
+        for event in events
+    ]
+
+
+def test_sent_delta_is_not_merged_into():
+    outbound = main.OutboundQueue(main.serialize_text_event, maxsize=0)
+    _put(outbound, _model_event("a", partial=True))
+    outbound.get_nowait()
+    _put(outbound, _model_event("b", partial=True))
+
+    (frame, _), = _drain(outbound)
+    assert orjson.loads(frame)["text"] == "b"
+
+
+def test_queue_past_max_bytes_raises():
+    outbound = main.OutboundQueue(main.serialize_event, max_bytes=1024)
+    with pytest.raises(asyncio.QueueFull):
+        for _ in range(100):
+            _put(outbound, _audio())
+    assert len(outbound) < 100
+
+
+def test_plain_text_event_is_compacted():
+    frame = main.serialize_text_event(_model_event("Hi", partial=True))
+    assert orjson.loads(frame) == {
+        "t": "d", "text": "Hi", "p": True, "a": "gauging_agent"
+    }
+
+
+@pytest.mark.parametrize(
+    "fields",
+    [
+        {"turn_complete": True},
+        {"error_code": "SAFETY"},
+        {"usage_metadata": types.GenerateContentResponseUsageMetadata(
+            total_token_count=3
+        )},
+        {"grounding_metadata": types.GroundingMetadata(
+            web_search_queries=["closures"]
+        )},
+    ],
+)
+def test_event_with_extra_fields_is_sent_in_full(fields):
+    event = _model_event("Hi", **fields)
+    assert main.serialize_text_event(event) == main.serialize_event(event)
+
+
+def test_thought_event_is_sent_in_full():
+    event = Event(
+        author="gauging_agent",
+        content=types.Content(
+            role="model", parts=[types.Part(text="Hmm", thought=True)]
+        ),
+    )
+    assert main.serialize_text_event(event) == main.serialize_event(event)
+
+
+class _RecordingQueue:
+    def __init__(self) -> None:
+        self.contents: list[types.Content] = []
+
+    def send_content(self, content: types.Content) -> None:
+        self.contents.append(content)
+
+
+def test_text_message_is_forwarded():
+    queue = _RecordingQueue()
+    main.send_text_message({"type": "text", "text": "hi"}, queue, False)
+    assert [c.parts[0].text for c in queue.contents] == ["hi"]
+
+
+@pytest.mark.parametrize("message", [
+    {"type": "text"},
+    {"type": "text", "text": 42},
+    {"type": "text", "text": ["hi"]},
+])
+def test_text_message_without_string_is_ignored(message):
+    queue = _RecordingQueue()
+    main.send_text_message(message, queue, False)
+    assert queue.contents == []